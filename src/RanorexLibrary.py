@@ -4,6 +4,7 @@
 
 from distutils.util import strtobool
 from robot.api import logger
+from robot.libraries.BuiltIn import BuiltIn
 import time
 
 type_casting = {
@@ -22,23 +23,29 @@ class RanorexLibrary(object):
     Documentation           This is the file where the RanorexLibrary will be imported.
     Library                 RanorexLibrary      path\\to\\Ranorex
 
-    The RanorexLibrary takes one argument:
+    The RanorexLibrary takes two arguments:
     The path to Ranorex has to be given so the RobotLibrary knows where to import the Ranorex .dll files from. Normally this path looks something like this: C:\\Program Files (x86)\\Ranorex 8.3Beta. Please make sure to use double back slashes (because of Robot-reasons).
+    The optional path to the path cache file is where the Resolve Path keyword remembers which alternative RanoreXPath resolved last time. It defaults to ranorexPathCache.json in the working directory. If it is empty, nothing is persisted between runs.
     """
 
     __version__ = '0.1'
 
     ROBOT_LIBRARY_SCOPE = 'TEST_SUITE'
     ROBOT_LIBRARY_DOC_FORMAT = 'reST'
+    ROBOT_LISTENER_API_VERSION = 2
 
     _logLevel = "INFO"
 
     
 
     # TODO: parameterize Ranorex options below
-    def __init__(self, pathToRanorex = "C:\\Program Files (x86)\\Ranorex\\Studio\\Bin"):
+    def __init__(self, pathToRanorex = "C:\\Program Files (x86)\\Ranorex\\Studio\\Bin", pathCacheFile = "ranorexPathCache.json"):
         import setupRanorexLibrary
         setupRanorexLibrary.importDlls(pathToRanorex)
+        import pathCacheRanorexLibrary
+        self._pathCache = pathCacheRanorexLibrary.PathCache(pathCacheFile)
+        self._screenshotBaselines = {}
+        self.ROBOT_LIBRARY_LISTENER = self
 
         global Ranorex
         import Ranorex
@@ -52,6 +59,10 @@ class RanorexLibrary(object):
         Ranorex.Keyboard.DefaultKeyPressTime = 100
         Ranorex.Delay.SpeedFactor = 1
 
+    def _close(self):
+        # Called by Robot when the suite that imported the library ends.
+        self._pathCache.flush()
+
     def _log(self, msg):
         logger.write(msg, self._logLevel, html=False)
 
@@ -331,6 +342,94 @@ class RanorexLibrary(object):
         if not elementFound:
             raise AssertionError('Element hasn\'t been found within the specified timeout of ' + duration + 'ms: ' + ranorexpath)
 
+    def _suiteName(self):
+        return BuiltIn().get_variable_value("${SUITE NAME}", "")
+
+    def _tryFind(self, ranorexpath, duration):
+        elementFound, newElement = Ranorex.Host.Local.TryFindSingle(Ranorex.Core.RxPath(ranorexpath), Ranorex.Duration(duration))
+        return elementFound
+
+    def resolve_path(self, ranorexpaths, duration = "30000", probeTimeout = "1000"):
+        """ Returns the first of several alternative RanoreXPaths that can be found.
+
+        Applications with several UI variants often need different paths for the same element. Instead of waiting the full timeout for every wrong candidate, this keyword probes all candidates in turn with a short timeout until one of them is found or the overall duration has passed. The path that resolved is remembered per suite in the path cache file and is tried first on the next call, also in later test runs.
+
+        :param ranorexpaths: List of alternative RanoreXPaths, ordered from most to least likely.
+        :param duration: The overall duration in ms that Ranorex searches for any of the paths. If none is found within this timeout, an error is raised.
+        :param probeTimeout: The duration in ms that each single candidate is searched for before the next one is tried.
+
+        :returns: The RanoreXPath that was found. It can be passed to any other keyword.
+
+        Example:
+        | @{paths} | `Create List` | /form[@title='Calculator']//button[@text='1'] | /winapp[@packagename='Microsoft.WindowsCalculator']//button[@automationid='num1Button'] |
+        | ${path} | `Resolve Path` | ${paths} |  |
+        | ${path} | `Resolve Path` | ${paths} | 10000 | 500 |
+        | `Click` | ${path} |  |  |
+        """
+        if not isinstance(ranorexpaths, (list, tuple)):
+            ranorexpaths = [ranorexpaths]
+        ranorexpaths = [str(ranorexpath) for ranorexpath in ranorexpaths]
+        if not ranorexpaths:
+            raise ValueError("Resolve Path needs at least one RanoreXPath.")
+        if duration == "":
+            duration = "30000"
+        if probeTimeout == "":
+            probeTimeout = "1000"
+        self._log("Resolve one of the paths " + ", ".join(ranorexpaths) + " within " + duration + "ms.")
+        intProbeTimeout = int(probeTimeout)
+        deadline = time.time() + int(duration) / 1000.0
+        suite = self._suiteName()
+
+        # The remembered path is probed first; all others keep their ranking.
+        cachedPath = self._pathCache.lookup(suite, ranorexpaths)
+        candidates = list(ranorexpaths)
+        if cachedPath is not None:
+            candidates.remove(cachedPath)
+            candidates.insert(0, cachedPath)
+
+        firstProbe = True
+        while True:
+            for ranorexpath in candidates:
+                remaining = int((deadline - time.time()) * 1000)
+                if remaining <= 0 and not firstProbe:
+                    break
+                if self._tryFind(ranorexpath, max(0, min(intProbeTimeout, remaining))):
+                    hit = firstProbe and ranorexpath == cachedPath
+                    if hit:
+                        self._log("Remembered path " + ranorexpath + " has been found.")
+                    else:
+                        self._log("Path " + ranorexpath + " has been found.")
+                    self._pathCache.record(suite, ranorexpaths, ranorexpath, hit)
+                    return ranorexpath
+                firstProbe = False
+            if time.time() >= deadline:
+                self._pathCache.recordFailure(suite, ranorexpaths)
+                raise AssertionError("None of the paths has been found within the specified timeout of " + duration + "ms: " + ", ".join(ranorexpaths))
+
+    def get_path_cache_statistics(self):
+        """ Returns how well the path cache of the current suite performs.
+
+        A hit means that the remembered path of a Resolve Path call was found right away, a miss means that the alternatives had to be probed, and a failure means that none of them was found. The hit rate is taken over all three.
+
+        :returns: A dictionary with the keys entries, hits, misses, failures and hit_rate (a float between 0 and 1).
+
+        Example:
+        | ${stats} | `Get Path Cache Statistics` |
+        | `Log` | Hit rate: ${stats['hit_rate']} |
+        """
+        statistics = self._pathCache.statistics(self._suiteName())
+        self._log("Path cache statistics: " + str(statistics["hits"]) + " hit(s), " + str(statistics["misses"]) + " miss(es).")
+        return statistics
+
+    def clear_path_cache(self):
+        """ Forgets all remembered paths of the current suite.
+
+        Example:
+        | `Clear Path Cache` |
+        """
+        self._log("Clearing the path cache.")
+        self._pathCache.clear(self._suiteName())
+
     def get_attribute_value(self, ranorexpath, attribute, type_cast="str"):
         """ Returns an attribute value of a UI element as string.
 
@@ -639,3 +738,117 @@ class RanorexLibrary(object):
         image.Save(imgName, System.Drawing.Imaging.ImageFormat.Png)
         htmlString = '<img src = "' + imgName + '">'
         logger.write(htmlString, self._logLevel, html = True)
+
+    def _captureSnapshot(self, ranorexpath = "", imagePath = ""):
+        import imageCompareRanorexLibrary
+        if imagePath != "":
+            image = System.Drawing.Image.FromFile(imagePath)
+        else:
+            image = Ranorex.Imaging.CaptureImageAuto(ranorexpath)
+        bitmap = System.Drawing.Bitmap(image)
+        try:
+            rectangle = System.Drawing.Rectangle(0, 0, bitmap.Width, bitmap.Height)
+            data = bitmap.LockBits(rectangle, System.Drawing.Imaging.ImageLockMode.ReadOnly, System.Drawing.Imaging.PixelFormat.Format32bppArgb)
+            try:
+                pixels = System.Array.CreateInstance(System.Byte, data.Stride * bitmap.Height)
+                System.Runtime.InteropServices.Marshal.Copy(data.Scan0, pixels, 0, pixels.Length)
+            finally:
+                bitmap.UnlockBits(data)
+            return imageCompareRanorexLibrary.Snapshot(bitmap.Width, bitmap.Height, data.Stride, pixels)
+        finally:
+            bitmap.Dispose()
+            image.Dispose()
+
+    def set_screenshot_baseline(self, name, ranorexpath = "", imagePath = ""):
+        """ Stores a baseline image for the Validate Screenshot Matches keyword.
+
+        Baselines are kept in memory for the current suite and are identified by their name. Setting a baseline with an existing name replaces it.
+
+        :param name: Name under which the baseline is stored.
+        :param ranorexpath: RanoreXPath of the element that a screenshot is taken of. Ignored if an image path is given.
+        :param imagePath: Path to an image file (e.g. saved with the Save Screenshot keyword) that is loaded as baseline instead of taking a screenshot.
+
+        Example:
+        | `Set Screenshot Baseline` | logo | /form[@controlname='RxMainFrame']//picture[@controlname='RxStudioLogo'] |  |
+        | `Set Screenshot Baseline` | logo |  | C:\\Users\\user\\Documents\\logo.png |
+        """
+        if ranorexpath == "" and imagePath == "":
+            raise ValueError("Set Screenshot Baseline needs either a RanoreXPath or an image path.")
+        if imagePath != "":
+            self._log("Loading screenshot baseline " + name + " from " + imagePath + ".")
+        else:
+            self._log("Capturing screenshot baseline " + name + " of element " + ranorexpath + ".")
+        self._screenshotBaselines[name] = self._captureSnapshot(ranorexpath, imagePath)
+
+    def validate_screenshot_matches(self, ranorexpath, name, tolerance = "0", maxDifference = "0", ignoreRegions = ""):
+        """ Validates that a screenshot of an element matches a stored baseline.
+
+        The comparison first compares hashes of square blocks of both images and then only looks at the single pixels of blocks that differ, so unchanged parts of the image cost very little.
+
+        :param ranorexpath: RanoreXPath of the element that a screenshot is taken of.
+        :param name: Name of the baseline, as given to the Set Screenshot Baseline keyword.
+        :param tolerance: How much (0 to 255) a color channel of a pixel may differ before the pixel counts as different.
+        :param maxDifference: How many percent of the compared pixels (all pixels outside the ignore regions) may be different for the validation to still pass.
+        :param ignoreRegions: Regions of the image that are not compared, given as x,y,width,height. Several regions can be given as list or separated by semicolons.
+
+        :raises: AssertionError if the validation fails.
+
+        Example:
+        | `Validate Screenshot Matches` | /form[@controlname='RxMainFrame']//picture[@controlname='RxStudioLogo'] | logo |  |  |  |
+        | `Validate Screenshot Matches` | /form[@controlname='RxMainFrame'] | mainframe | 10 | 0.5 | 0,0,200,20;300,40,50,50 |
+        """
+        if tolerance == "":
+            tolerance = "0"
+        if maxDifference == "":
+            maxDifference = "0"
+        self._log("Validate that a screenshot of element " + ranorexpath + " matches the baseline " + name + ".")
+        import imageCompareRanorexLibrary
+        if name not in self._screenshotBaselines:
+            raise AssertionError("There is no screenshot baseline with the name " + name + ".")
+        regions = imageCompareRanorexLibrary.parseRegions(ignoreRegions)
+        expected = self._screenshotBaselines[name]
+        actual = self._captureSnapshot(ranorexpath)
+        if actual.width * actual.height == 0:
+            raise AssertionError("Screenshot of element " + ranorexpath + " is empty and can't match the baseline " + name + ".")
+        different = imageCompareRanorexLibrary.countDifferentPixels(expected, actual, int(tolerance), regions)
+        compared = imageCompareRanorexLibrary.countComparedPixels(actual.width, actual.height, regions)
+        if compared == 0:
+            raise AssertionError("The ignore regions cover the whole screenshot, so nothing has been compared with the baseline " + name + ".")
+        percentage = 100.0 * different / compared
+        if percentage > float(maxDifference):
+            raise AssertionError("Screenshot doesn't match the baseline " + name + ". " + str(different) + " pixel(s) (" + str(round(percentage, 2)) + "%) differ, but only " + maxDifference + "% are allowed.")
+
+    def wait_until_screenshot_stable(self, ranorexpath, duration = "10000", interval = "500", tolerance = "0", ignoreRegions = ""):
+        """ Waits until consecutive screenshots of an element stop changing.
+
+        This is useful to wait for animations or loading content to finish before validating a screenshot.
+
+        :param ranorexpath: RanoreXPath of the element that screenshots are taken of.
+        :param duration: The duration in ms to wait for the element to become stable. If it still changes after this timeout, an error is raised.
+        :param interval: The time in ms between two screenshots.
+        :param tolerance: How much (0 to 255) a color channel of a pixel may differ before the pixel counts as changed.
+        :param ignoreRegions: Regions of the image that are not compared, given as x,y,width,height. Several regions can be given as list or separated by semicolons.
+
+        Example:
+        | `Wait Until Screenshot Stable` | /form[@controlname='RxMainFrame'] |  |  |  |  |
+        | `Wait Until Screenshot Stable` | /form[@controlname='RxMainFrame'] | 5000 | 250 | 10 | 0,0,200,20 |
+        """
+        if duration == "":
+            duration = "10000"
+        if interval == "":
+            interval = "500"
+        if tolerance == "":
+            tolerance = "0"
+        self._log("Wait " + duration + "ms for screenshots of element " + ranorexpath + " to stop changing.")
+        import imageCompareRanorexLibrary
+        regions = imageCompareRanorexLibrary.parseRegions(ignoreRegions)
+        intTolerance = int(tolerance)
+        deadline = time.time() + int(duration) / 1000.0
+        previous = self._captureSnapshot(ranorexpath)
+        while time.time() < deadline:
+            time.sleep(int(interval) / 1000.0)
+            current = self._captureSnapshot(ranorexpath)
+            if previous.width == current.width and previous.height == current.height and imageCompareRanorexLibrary.countDifferentPixels(previous, current, intTolerance, regions) == 0:
+                return
+            previous = current
+        raise AssertionError("Screenshots of element " + ranorexpath + " haven't stopped changing within the specified timeout of " + duration + "ms.")
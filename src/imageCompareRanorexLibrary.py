@@ -0,0 +1,134 @@
+import hashlib
+
+BYTES_PER_PIXEL = 4
+PIXELS_PER_CHUNK = 8
+
+
+class Snapshot(object):
+    """ The raw 32 bit ARGB pixels of a captured image, held in a bytearray.
+
+    The image is divided into square blocks whose MD5 digests are computed once, so that comparing two snapshots only has to look at the pixels of blocks that differ.
+    """
+
+    def __init__(self, width, height, stride, pixels, blockSize = 32):
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.pixels = bytearray(pixels)
+        self.blockSize = blockSize
+        self._blockHashes = None
+
+    def blocks(self):
+        for top in range(0, self.height, self.blockSize):
+            for left in range(0, self.width, self.blockSize):
+                yield (left, top, min(self.blockSize, self.width - left), min(self.blockSize, self.height - top))
+
+    def rowSlice(self, left, row, width):
+        start = row * self.stride + left * BYTES_PER_PIXEL
+        return self.pixels[start:start + width * BYTES_PER_PIXEL]
+
+    def blockHashes(self):
+        if self._blockHashes is None:
+            self._blockHashes = {}
+            for block in self.blocks():
+                left, top, width, height = block
+                digest = hashlib.md5()
+                for row in range(top, top + height):
+                    digest.update(self.rowSlice(left, row, width))
+                self._blockHashes[block] = digest.digest()
+        return self._blockHashes
+
+
+def parseRegions(regions):
+    """ Parses ignore regions given as "x,y,width,height" strings, either as a list or separated by semicolons. """
+    if not isinstance(regions, (list, tuple)):
+        regions = str(regions).split(";")
+    parsed = []
+    for region in regions:
+        region = str(region).strip()
+        if region == "":
+            continue
+        values = [int(value) for value in region.split(",")]
+        if len(values) != 4:
+            raise ValueError("Ignore region must look like x,y,width,height, but got " + region + ".")
+        parsed.append(tuple(values))
+    return parsed
+
+
+def _inRegion(x, y, region):
+    left, top, width, height = region
+    return left <= x < left + width and top <= y < top + height
+
+
+def _blockIgnored(block, regions):
+    left, top, width, height = block
+    for region in regions:
+        if _inRegion(left, top, region) and _inRegion(left + width - 1, top + height - 1, region):
+            return True
+    return False
+
+
+def _comparedColumns(row, left, right, regions):
+    """ Returns the column ranges between left and right of a row that are not covered by an ignore region. """
+    ignored = sorted((max(left, x), min(right, x + width)) for x, y, width, height in regions if y <= row < y + height and x < right and x + width > left)
+    columns = []
+    for start, end in ignored:
+        if start > left:
+            columns.append((left, start))
+        left = max(left, end)
+    if left < right:
+        columns.append((left, right))
+    return columns
+
+
+def countComparedPixels(width, height, regions = ()):
+    """ Returns the number of pixels of an image that are not covered by an ignore region. """
+    compared = 0
+    for row in range(height):
+        for start, end in _comparedColumns(row, 0, width, regions):
+            compared += end - start
+    return compared
+
+
+def _countDifferentInRow(expectedRow, actualRow, tolerance):
+    # Chunks of pixels are compared as whole slices first, so with sparse differences most pixels are never looked at one by one.
+    chunkSize = PIXELS_PER_CHUNK * BYTES_PER_PIXEL
+    different = 0
+    for chunk in range(0, len(expectedRow), chunkSize):
+        if expectedRow[chunk:chunk + chunkSize] == actualRow[chunk:chunk + chunkSize]:
+            continue
+        for offset in range(chunk, min(chunk + chunkSize, len(expectedRow)), BYTES_PER_PIXEL):
+            if expectedRow[offset:offset + BYTES_PER_PIXEL] == actualRow[offset:offset + BYTES_PER_PIXEL]:
+                continue
+            if (abs(expectedRow[offset] - actualRow[offset]) > tolerance
+                    or abs(expectedRow[offset + 1] - actualRow[offset + 1]) > tolerance
+                    or abs(expectedRow[offset + 2] - actualRow[offset + 2]) > tolerance
+                    or abs(expectedRow[offset + 3] - actualRow[offset + 3]) > tolerance):
+                different += 1
+    return different
+
+
+def countDifferentPixels(expected, actual, tolerance = 0, regions = ()):
+    """ Returns the number of pixels whose channels differ by more than the tolerance, outside of the ignore regions.
+
+    Blocks with equal digests are skipped, and within differing blocks only the parts of rows that aren't byte-for-byte equal are inspected pixel by pixel.
+    """
+    if expected.width != actual.width or expected.height != actual.height:
+        raise AssertionError("Image sizes differ. Expected " + str(expected.width) + "x" + str(expected.height) + ", but got " + str(actual.width) + "x" + str(actual.height) + " instead.")
+    expectedHashes = expected.blockHashes()
+    actualHashes = actual.blockHashes()
+    different = 0
+    for block in expected.blocks():
+        if expectedHashes[block] == actualHashes[block] or _blockIgnored(block, regions):
+            continue
+        left, top, width, height = block
+        for row in range(top, top + height):
+            expectedRow = expected.rowSlice(left, row, width)
+            actualRow = actual.rowSlice(left, row, width)
+            if expectedRow == actualRow:
+                continue
+            for start, end in _comparedColumns(row, left, left + width, regions):
+                first = (start - left) * BYTES_PER_PIXEL
+                last = (end - left) * BYTES_PER_PIXEL
+                different += _countDifferentInRow(expectedRow[first:last], actualRow[first:last], tolerance)
+    return different
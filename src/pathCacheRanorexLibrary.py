@@ -0,0 +1,140 @@
+from robot.api import logger
+import json
+import os
+
+try:
+    from os import replace as _replaceFile
+except ImportError:
+    # IronPython 2.7 has no os.replace, and os.rename refuses to overwrite an existing file on Windows.
+    def _replaceFile(source, target):
+        import System
+        if System.IO.File.Exists(target):
+            System.IO.File.Replace(source, target, None)
+        else:
+            System.IO.File.Move(source, target)
+
+
+def _validEntry(entry):
+    if not isinstance(entry, dict):
+        return False
+    if entry.get("path") is not None and not isinstance(entry["path"], type(u"")):
+        return False
+    for counter in ("hits", "misses", "failures"):
+        if not isinstance(entry.get(counter, 0), int) or isinstance(entry.get(counter, 0), bool):
+            return False
+    return "hits" in entry and "misses" in entry
+
+
+class PathCache(object):
+    """ Remembers which of several alternative RanoreXPaths resolved last time.
+
+    Entries are stored per suite and per list of alternatives in a small JSON file, so that the knowledge survives between test runs. The file is only written right away when a remembered path changes; the hit and miss counters are written by flush.
+    """
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        self.entries = self._load()
+        if self.entries is None:
+            logger.warn("Path cache file " + self.fileName + " can't be parsed. Remembered paths won't be saved until it is fixed or deleted.")
+            self.entries = {}
+        self._dirty = set()
+
+    def _load(self):
+        """ Returns the valid entries from the file, {} if there is no file, or None if it can't be parsed. """
+        if not self.fileName or not os.path.isfile(self.fileName):
+            return {}
+        try:
+            with open(self.fileName, "r") as cacheFile:
+                loaded = json.load(cacheFile)
+        except (IOError, ValueError):
+            return None
+        if not isinstance(loaded, dict):
+            return None
+        entries = {}
+        for suite, suiteEntries in loaded.items():
+            if not isinstance(suiteEntries, dict):
+                continue
+            for key, entry in suiteEntries.items():
+                if _validEntry(entry):
+                    entry.setdefault("failures", 0)
+                    entries.setdefault(suite, {})[key] = entry
+        return entries
+
+    def _key(self, ranorexpaths):
+        return "\n".join(ranorexpaths)
+
+    def _entry(self, suite, ranorexpaths):
+        return self.entries.setdefault(suite, {}).setdefault(self._key(ranorexpaths), {"path": None, "hits": 0, "misses": 0, "failures": 0})
+
+    def lookup(self, suite, ranorexpaths):
+        """ Returns the path that resolved last time for these alternatives, or None. """
+        entry = self.entries.get(suite, {}).get(self._key(ranorexpaths))
+        if entry is None or entry["path"] not in ranorexpaths:
+            return None
+        return entry["path"]
+
+    def record(self, suite, ranorexpaths, path, hit):
+        """ Stores the path that resolved and counts whether the remembered path was the one that worked. """
+        entry = self._entry(suite, ranorexpaths)
+        if hit:
+            entry["hits"] += 1
+        else:
+            entry["misses"] += 1
+        self._dirty.add((suite, self._key(ranorexpaths)))
+        if entry["path"] != path:
+            entry["path"] = path
+            self.flush()
+
+    def recordFailure(self, suite, ranorexpaths):
+        """ Counts a call in which none of the alternatives resolved. """
+        self._entry(suite, ranorexpaths)["failures"] += 1
+        self._dirty.add((suite, self._key(ranorexpaths)))
+
+    def statistics(self, suite):
+        """ Returns the hits, misses, failures and hit rate over all entries of a suite. """
+        hits = 0
+        misses = 0
+        failures = 0
+        for entry in self.entries.get(suite, {}).values():
+            hits += entry["hits"]
+            misses += entry["misses"]
+            failures += entry["failures"]
+        total = hits + misses + failures
+        hitRate = float(hits) / total if total else 0.0
+        return {"entries": len(self.entries.get(suite, {})), "hits": hits, "misses": misses, "failures": failures, "hit_rate": hitRate}
+
+    def clear(self, suite):
+        """ Forgets all entries of a suite. """
+        self.entries.pop(suite, None)
+        self._dirty = set((dirtySuite, key) for dirtySuite, key in self._dirty if dirtySuite != suite)
+        self._write(lambda entries: entries.pop(suite, None))
+        self.flush()
+
+    def flush(self):
+        """ Writes all changed entries to the file. """
+        if not self._dirty:
+            return
+        dirty = self._dirty
+
+        def update(entries):
+            for suite, key in dirty:
+                entries.setdefault(suite, {})[key] = self.entries[suite][key]
+
+        if self._write(update):
+            self._dirty = set()
+
+    def _write(self, update):
+        if not self.fileName:
+            return True
+        # Other suites may have written to the file in the meantime, so the changes are merged into what is on disk.
+        entries = self._load()
+        if entries is None:
+            # Never replace a file that can't be read (e.g. written by hand) with a nearly empty one.
+            logger.warn("Path cache file " + self.fileName + " can't be parsed, so the remembered paths haven't been saved.")
+            return False
+        update(entries)
+        temporaryName = self.fileName + "." + str(os.getpid()) + ".tmp"
+        with open(temporaryName, "w") as cacheFile:
+            json.dump(entries, cacheFile, indent=2, sort_keys=True)
+        _replaceFile(temporaryName, self.fileName)
+        return True